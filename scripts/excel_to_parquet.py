@@ -5,31 +5,125 @@ Usage:
   python scripts/excel_to_parquet.py --input path/to/workbook.xlsx --output data/out.parquet
 
 The script reads the first sheet by default (sheet index 0) and writes a Parquet file.
-It uses `pandas.read_excel` for reading and `DataFrame.to_parquet` for writing.
+Rows are streamed from `openpyxl` in read-only mode and written one row group at a time
+with `pyarrow.parquet.ParquetWriter`, so memory stays bounded by the batch size rather
+than the sheet size. Other formats (.xls, .ods) or another `--engine` (xlrd, odf) fall back
+to `pandas.read_excel`.
+
+Column types come from the first batch of rows. On the streaming path every numeric column,
+including whole-number columns such as IDs and years, is written as float64 (where pandas
+would write int64), so fractional values in later batches are kept. Excel error values
+such as `#N/A` and the strings pandas treats as missing are written as nulls.
 """
+from itertools import islice
 from pathlib import Path
 import argparse
 import sys
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+BATCH_SIZE = 50_000
+# Workbook formats openpyxl can stream; anything else goes through pandas
+STREAMING_SUFFIXES = (".xlsx", ".xlsm")
+
+# Cell values written as nulls: Excel's error values, which openpyxl returns as strings,
+# and the default na_values of pandas.read_excel
+NA_STRINGS = frozenset([
+    "#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A", "#GETTING_DATA",
+    "#SPILL!", "#CALC!",
+    "", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+])
+
+# zstd level 3 compresses better than the snappy default at similar speed
+PARQUET_WRITE_OPTIONS = {
+    "compression": "zstd",
+    "compression_level": 3,
+    "use_dictionary": True,
+    "data_page_size": 1 << 20,
+}
+
+
+def _clean_values(values):
+    return [None if isinstance(value, str) and value in NA_STRINGS else value for value in values]
+
+
+def _infer_schema(header, columns):
+    # Infer each column type from the first batch; all-empty columns become strings.
+    # Numbers are stored as float64, as Excel does, so a later batch with 12.5 in a
+    # column of whole numbers still fits instead of being cut down to an integer.
+    fields = []
+    for name, values in zip(header, columns):
+        try:
+            arrow_type = pa.array(values).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as exc:
+            raise ValueError(f"Column {name!r} mixes value types in the first rows: {exc}") from exc
+        if pa.types.is_null(arrow_type):
+            arrow_type = pa.string()
+        elif pa.types.is_integer(arrow_type):
+            arrow_type = pa.float64()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _to_array(values, field):
+    # Cast safely so a value that does not fit the column type raises instead of being truncated
+    try:
+        return pa.array(values).cast(field.type, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as exc:
+        raise ValueError(f"Column {field.name!r} does not fit type {field.type} inferred from the first rows: {exc}") from exc
+
+
+def _stream_sheet(input_path: Path, output_path: Path, sheet=0, batch_size: int = BATCH_SIZE):
+    wb = load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        rows = ws.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            raise ValueError(f"Sheet {sheet!r} is empty")
+        header = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+
+        writer = None
+        try:
+            while True:
+                batch_rows = list(islice(rows, batch_size))
+                if not batch_rows and writer is not None:
+                    break
+                columns = [_clean_values(col) for col in zip(*batch_rows)] or [[] for _ in header]
+                if writer is None:
+                    schema = _infer_schema(header, columns)
+                    writer = pq.ParquetWriter(output_path, schema, **PARQUET_WRITE_OPTIONS)
+                arrays = [_to_array(values, field) for values, field in zip(columns, schema)]
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                if len(batch_rows) < batch_size:
+                    break
+        finally:
+            if writer is not None:
+                writer.close()
+    finally:
+        wb.close()
 
 
 def excel_to_parquet(input_path: Path, output_path: Path, sheet=0, engine: str | None = None):
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
-    # Read the specified sheet (default first sheet). Let pandas infer dtypes and parse dates.
-    read_kwargs = {"sheet_name": sheet}
-    if engine:
-        read_kwargs["engine"] = engine
-
-    df = pd.read_excel(input_path, **read_kwargs)
-
     # Ensure output directory exists
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Write parquet. pandas will use pyarrow or fastparquet if available.
-    df.to_parquet(output_path, index=False)
+    if engine == "openpyxl" or (engine is None and input_path.suffix.lower() in STREAMING_SUFFIXES):
+        _stream_sheet(input_path, output_path, sheet=sheet)
+        return
+
+    # Other formats and engines have no streaming reader, so load the whole sheet through
+    # pandas, which picks the engine from the file extension when none is given.
+    df = pd.read_excel(input_path, sheet_name=sheet, engine=engine)
+    df.to_parquet(output_path, index=False, engine="pyarrow", row_group_size=BATCH_SIZE, **PARQUET_WRITE_OPTIONS)
 
 
 def main(argv=None):
@@ -37,7 +131,9 @@ def main(argv=None):
     parser.add_argument("--input", "-i", required=True, help="Path to input Excel workbook")
     parser.add_argument("--output", "-o", required=True, help="Path to output Parquet file")
     parser.add_argument("--sheet", "-s", default=0, help="Sheet name or zero-based index (default: 0)")
-    parser.add_argument("--engine", "-e", default=None, help="Optional pandas Excel engine (openpyxl, xlrd, odf)")
+    parser.add_argument("--engine", "-e", default=None,
+                        help="Optional Excel engine (default: streaming openpyxl for .xlsx/.xlsm, "
+                             "otherwise chosen by pandas; xlrd or odf use pandas)")
 
     args = parser.parse_args(argv)
 
@@ -6,78 +6,151 @@ Usage: python scripts/generate_exposure_parquet.py --rows 300 --output data/expo
 This script creates a table with realistic-ish columns and random values.
 """
 import argparse
-import random
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from faker import Faker
 
-
-def generate_vessel_row(i, faker, seed=None):
-    vessel_id = f"VSL-{i:05d}"
-    vessel_name = faker.company() + " " + faker.word().title()
-    # IMO numbers are 7-digit numeric identifiers (we'll generate a 7-digit int)
-    build_year = random.randint(1970, 2023)
-    vessel_type = random.choice([
-        "Bulk Carrier",
-        "Container",
-        "Tanker",
-        "Passenger",
-        "General Cargo",
-        "Chemical Tanker",
-        "LNG Carrier",
-        "Offshore Support",
-    ])
-    operator = faker.company()
+try:
+    import numba
+except ImportError:  # numba is optional; premiums are computed with NumPy without it
+    numba = None
+
+
+VESSEL_TYPES = np.array([
+    "Bulk Carrier",
+    "Container",
+    "Tanker",
+    "Passenger",
+    "General Cargo",
+    "Chemical Tanker",
+    "LNG Carrier",
+    "Offshore Support",
+], dtype=object)
+
+CARGO_TYPES = np.array([
+    "General Cargo",
+    "Dry Bulk",
+    "Oil",
+    "Chemicals",
+    "Containers",
+    "Liquified Gas",
+], dtype=object)
+
+# Simple premium estimate: insured_value * base_rate * (1 + risk_adj)
+BASE_RATE = 0.002  # 0.2% as baseline
+
+# Upper bound on the number of distinct Faker company names and words generated per chunk
+NAME_POOL_SIZE = 5000
+
+# Output schema, declared once: narrow integer types and dictionary-encoded enum-like columns.
+# Rounded decimals stay float64, since float32 would not read back as the rounded values.
+SCHEMA = pa.schema([
+    ("vesselId", pa.string()),
+    ("vessel", pa.string()),
+    ("operator", pa.string()),
+    ("year", pa.int16()),
+    ("type", pa.dictionary(pa.int8(), pa.string())),
+    ("value", pa.float64()),
+    ("tonnage", pa.float64()),
+    ("length", pa.float64()),
+    ("cargoType", pa.dictionary(pa.int8(), pa.string())),
+    ("premium", pa.float64()),
+])
+
+# Rows per Parquet row group
+ROW_GROUP_ROWS = 65536
+# Rows generated per task. Fixed, so a given seed produces the same data for any number of workers,
+# and a multiple of ROW_GROUP_ROWS so every row group except the last is full
+CHUNK_ROWS = 2 * ROW_GROUP_ROWS
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def compute_premium(insured_value, risk_score, out):
+        # Fused loop: touches each element once instead of allocating NumPy temporaries
+        for i in numba.prange(insured_value.shape[0]):
+            out[i] = round(insured_value[i] * BASE_RATE * (1.0 + risk_score[i] / 200.0), 2)
+else:
+    def compute_premium(insured_value, risk_score, out):
+        np.round(insured_value * BASE_RATE * (1 + risk_score / 200.0), 2, out=out)
+
+
+def _init_worker():
+    # The worker processes already share the cores between them, so each one runs the numba
+    # kernel on a single thread instead of starting a thread per core on top
+    if numba is not None:
+        numba.set_num_threads(1)
+
+
+def generate_chunk(start, stop, seed_seq):
+    """Generate rows ``start`` (inclusive) to ``stop`` (exclusive) from an independent random stream."""
+    rows = stop - start
+
+    # Draw every column as a full-length array in one call instead of building rows one at a time
+    rng = np.random.default_rng(seed_seq)
+
+    # Seed Faker from the same Generator so a single seed drives every column
+    faker = Faker()
+    faker.seed_instance(int(rng.integers(2**32)))
+
+    vessel_ids = [f"VSL-{i:05d}" for i in range(start + 1, stop + 1)]
+    # Faker is pure Python, so draw a bounded pool of names once and index into it
+    pool_size = max(1, min(rows, NAME_POOL_SIZE))
+    companies = np.array([faker.company() for _ in range(pool_size)], dtype=object)
+    words = np.array([faker.word().title() for _ in range(pool_size)], dtype=object)
+    vessel_names = (
+        companies[rng.integers(0, pool_size, size=rows)] + " " + words[rng.integers(0, pool_size, size=rows)]
+    )
+    operators = companies[rng.integers(0, pool_size, size=rows)]
+
+    build_year = rng.integers(1970, 2024, size=rows)
+    # Categorical columns are drawn as integer codes into the module-level category arrays
+    vessel_type_codes = rng.integers(0, len(VESSEL_TYPES), size=rows, dtype=np.int8)
 
     # Insured value in USD between 1M and 200M
-    insured_value = round(float(np.random.uniform(1_000_000, 200_000_000)), 2)
-
-    tonnage = round(float(np.random.uniform(1000, 300000)), 2)
-    length_m = round(float(np.random.uniform(50, 400)), 2)
-    cargo_type = random.choice([
-        "General Cargo",
-        "Dry Bulk",
-        "Oil",
-        "Chemicals",
-        "Containers",
-        "Liquified Gas",
-    ])
-
-    risk_score = round(float(np.random.beta(2, 8) * 100), 2)
-
-    # Simple premium estimate: insured_value * base_rate * (1 + risk_adj)
-    base_rate = 0.002  # 0.2% as baseline
-    premium_estimate = round(insured_value * base_rate * (1 + risk_score / 200.0), 2)
-
-    return {
-        "vesselId": vessel_id,
-        "vessel": vessel_name,
-        "operator": operator,
+    insured_value = np.round(rng.uniform(1_000_000, 200_000_000, size=rows), 2)
+
+    tonnage = np.round(rng.uniform(1000, 300000, size=rows), 2)
+    length_m = np.round(rng.uniform(50, 400, size=rows), 2)
+    cargo_type_codes = rng.integers(0, len(CARGO_TYPES), size=rows, dtype=np.int8)
+
+    risk_score = np.round(rng.beta(2, 8, size=rows) * 100, 2)
+
+    premium_estimate = np.empty(rows)
+    compute_premium(insured_value, risk_score, premium_estimate)
+
+    # Enum-like columns are built as dictionary arrays straight from the drawn codes
+    return pa.table({
+        "vesselId": vessel_ids,
+        "vessel": vessel_names,
+        "operator": operators,
         "year": build_year,
-        "type": vessel_type,
+        "type": pa.DictionaryArray.from_arrays(vessel_type_codes, VESSEL_TYPES),
         "value": insured_value,
         "tonnage": tonnage,
         "length": length_m,
-        "cargoType": cargo_type,
+        "cargoType": pa.DictionaryArray.from_arrays(cargo_type_codes, CARGO_TYPES),
         "premium": premium_estimate,
-    }
+    }, schema=SCHEMA)
 
 
-def generate_dataframe(rows=50, seed=None):
-    if seed is not None:
-        random.seed(seed)
-        np.random.seed(seed)
+def generate_chunks(rows=50, seed=None, workers=None):
+    """Yield the rows as consecutive tables of up to CHUNK_ROWS rows each."""
+    # Each chunk has its own child seed; chunks are generated in parallel worker
+    # processes when there is more than one
+    starts = list(range(0, rows, CHUNK_ROWS)) or [0]
+    stops = [min(start + CHUNK_ROWS, rows) for start in starts]
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
 
-    faker = Faker()
-    if seed is not None:
-        Faker.seed(seed)
-
-    records = [generate_vessel_row(i + 1, faker, seed=seed) for i in range(rows)]
-    df = pd.DataFrame.from_records(records)
-
-    return df
+    if len(starts) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            yield from executor.map(generate_chunk, starts, stops, seeds)
+    else:
+        yield from map(generate_chunk, starts, stops, seeds)
 
 
 def main():
@@ -86,18 +159,31 @@ def main():
                         help="Number of rows to generate (default: 100)")
     parser.add_argument("--output", type=str, default="data/exposures.parquet", help="Output Parquet file path")
     parser.add_argument("--seed", type=int, default=None, help="Optional random seed for reproducibility")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes used when --rows exceeds one chunk (default: all CPUs)")
 
     args = parser.parse_args()
 
     out_path = Path(args.output)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    df = generate_dataframe(rows=args.rows, seed=args.seed)
-
-    # Write Parquet (pandas will use pyarrow or fastparquet if available)
-    df.to_parquet(out_path, index=False)
-
-    print(f"Wrote {len(df)} rows to {out_path}")
+    # Stream chunks into one Parquet file with zstd compression. Dictionary encoding suits the
+    # low-cardinality string columns and column statistics let DuckDB skip row groups when filtering
+    written = 0
+    with pq.ParquetWriter(
+        out_path,
+        SCHEMA,
+        compression="zstd",
+        compression_level=3,
+        use_dictionary=True,
+        data_page_size=1 << 20,
+        write_statistics=True,
+    ) as writer:
+        for chunk in generate_chunks(rows=args.rows, seed=args.seed, workers=args.workers):
+            writer.write_table(chunk, row_group_size=ROW_GROUP_ROWS)
+            written += chunk.num_rows
+
+    print(f"Wrote {written} rows to {out_path}")
 
 
 if __name__ == "__main__":
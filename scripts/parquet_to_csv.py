@@ -1,13 +1,18 @@
-import pandas as pd
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 from pathlib import Path
 
 
-def parquet_to_csv(input_file: str) -> str:
+def parquet_to_csv(input_file: str, batch_size: int = 65536) -> str:
     """
     Convert a parquet file to CSV format.
+
+    Record batches are streamed from the parquet file straight into Arrow's
+    CSV writer, so memory use is bounded by ``batch_size`` rows.
     
     Args:
         input_file: Path to the input parquet file
+        batch_size: Number of rows to read and write per batch
         
     Returns:
         Path to the output CSV file
@@ -15,8 +20,10 @@ def parquet_to_csv(input_file: str) -> str:
     input_path = Path(input_file)
     output_path = input_path.with_suffix('.csv')
     
-    df = pd.read_parquet(input_path)
-    df.to_csv(output_path, index=False)
+    parquet_file = pq.ParquetFile(input_path)
+    with pa_csv.CSVWriter(output_path, parquet_file.schema_arrow) as writer:
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            writer.write_batch(batch)
     
     return str(output_path)
 
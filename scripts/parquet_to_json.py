@@ -1,13 +1,32 @@
-import pandas as pd
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 import sys
 from pathlib import Path
 
-def parquet_to_json(input_file):
+
+def _dates_to_epoch_ms(batch):
+    """Cast date/timestamp columns to epoch milliseconds, as pandas' to_json did."""
+    columns = []
+    for column in batch.columns:
+        if pa.types.is_timestamp(column.type):
+            column = column.cast(pa.timestamp('ms', tz=column.type.tz)).cast(pa.int64())
+        elif pa.types.is_date(column.type):
+            column = column.cast(pa.timestamp('ms')).cast(pa.int64())
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def parquet_to_json(input_file, batch_size=16384):
     """
     Convert a Parquet file to JSON format.
+
+    Rows are streamed from the Parquet file in batches and serialized with
+    orjson, so the whole table is never held in memory at once.
     
     Args:
         input_file: Path to the input Parquet file
+        batch_size: Number of rows to read and serialize per batch
     """
     input_path = Path(input_file)
     
@@ -24,9 +43,20 @@ def parquet_to_json(input_file):
     # Generate output filename with .json extension
     output_path = input_path.with_suffix('.json')
     
-    # Read Parquet file and convert to JSON
-    df = pd.read_parquet(input_file)
-    df.to_json(output_path, orient='records', lines=False)
+    # Stream Parquet batches out as a single JSON array of records
+    parquet_file = pq.ParquetFile(input_path)
+    with open(output_path, 'wb') as f:
+        f.write(b'[')
+        first = True
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            rows = _dates_to_epoch_ms(batch).to_pylist()
+            if not rows:
+                continue
+            if not first:
+                f.write(b',')
+            f.write(b','.join(orjson.dumps(row) for row in rows))
+            first = False
+        f.write(b']')
     
     print(f"Successfully converted '{input_file}' to '{output_path}'")
 
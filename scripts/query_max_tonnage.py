@@ -1,16 +1,14 @@
 import duckdb
 
-# Query the parquet file directly
-print('Columns and sample data:')
-print(duckdb.sql("SELECT * FROM './scripts/data/exposures.parquet' LIMIT 10"))
+# Open one connection and register the parquet file once
+con = duckdb.connect()
+con.execute("CREATE VIEW exposures AS SELECT * FROM read_parquet('./scripts/data/exposures.parquet')")
 
-# Get total record count
-count_result = duckdb.sql("SELECT COUNT(*) as total FROM './scripts/data/exposures.parquet'")
-print(f'Total records: {count_result}')
+print('Columns and sample data:')
+print(con.sql("SELECT * FROM exposures LIMIT 10"))
 
-# # Query for the vessel with the highest tonnage
-print(duckdb.sql("""SELECT vessel, operator, year, tonnage 
-                 FROM './scripts/data/exposures.parquet'
-                 ORDER BY tonnage DESC
-                 LIMIT 1
-                 """))
+# Get the total record count and the vessel with the highest tonnage in a single scan
+print(con.sql("""SELECT COUNT(*) OVER () AS total, vessel, operator, year, tonnage
+              FROM exposures
+              QUALIFY ROW_NUMBER() OVER (ORDER BY tonnage DESC) = 1
+              """))
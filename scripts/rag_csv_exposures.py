@@ -1,10 +1,10 @@
-import csv
 import os
 
 import azure.identity
+import duckdb
+import numpy as np
 import openai
 from dotenv import load_dotenv
-from lunr import lunr
 
 # Setup the Azure OpenAI client
 load_dotenv(override=True)
@@ -18,15 +18,64 @@ client = openai.AzureOpenAI(
     api_version="2024-08-01-preview"
 )
 MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
+# Optional: when set, rows are retrieved by embedding similarity instead of full-text search
+EMBEDDING_MODEL_NAME = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+EMBEDDING_BATCH_SIZE = 1024
 
 csv_path = os.path.join(os.path.dirname(__file__), "data", "exposures.csv")
 
-# Index the data from the CSV
-with open(csv_path) as file:
-    reader = csv.reader(file)
-    rows = list(reader)
-documents = [{"id": (i + 1), "body": " ".join(row)} for i, row in enumerate(rows[1:])]
-index = lunr(ref="id", fields=["body"], documents=documents)
+# Load the CSV into DuckDB. Full-text search only needs the fts extension and its BM25 index
+# when no embedding deployment is configured.
+con = duckdb.connect()
+con.execute("CREATE TABLE exposures AS SELECT * FROM read_csv(?, header = true, all_varchar = true)", [csv_path])
+columns = [column[0] for column in con.execute("SELECT * FROM exposures LIMIT 0").description]
+
+if not EMBEDDING_MODEL_NAME:
+    # The fts extension is downloaded the first time it is installed, so the first run needs
+    # network access; after that it loads from DuckDB's local extension directory.
+    try:
+        con.execute("LOAD fts")
+    except duckdb.Error:
+        try:
+            con.execute("INSTALL fts; LOAD fts;")
+        except duckdb.Error as exc:
+            raise RuntimeError(
+                "Could not install the DuckDB fts extension. Run once with network access, "
+                "or install it from a local file with INSTALL '/path/to/fts.duckdb_extension'."
+            ) from exc
+    # The default ignore pattern drops every non-letter, which would reduce IDs like VSL-00005
+    # to "vsl" and make years and values unsearchable; keep digits so they are indexed as terms
+    con.execute(r"PRAGMA create_fts_index('exposures', 'vesselId', '*', ignore = '(\\.|[^a-z0-9])+')")
+
+search_query = """
+SELECT * EXCLUDE (score)
+FROM (
+    SELECT *, fts_main_exposures.match_bm25(vesselId, ?) AS score
+    FROM exposures
+)
+WHERE score IS NOT NULL
+ORDER BY score DESC
+LIMIT 10
+"""
+
+
+def embed(texts):
+    """Embed texts in batches and return unit-length float32 row vectors."""
+    vectors = []
+    for i in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        response = client.embeddings.create(model=EMBEDDING_MODEL_NAME, input=texts[i:i + EMBEDDING_BATCH_SIZE])
+        vectors.extend(item.embedding for item in response.data)
+    matrix = np.array(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+# Embed every row once up front; each question then costs one embedding call and one matrix-vector product.
+# Rows stay in a columnar Arrow table and only the matches are converted to Python values per question.
+if EMBEDDING_MODEL_NAME:
+    exposures = con.execute("SELECT *, concat_ws(' | ', *COLUMNS(*)) AS row_text FROM exposures").to_arrow_table()
+    row_vectors = embed(exposures.column("row_text").to_pylist())
+    exposures = exposures.select(columns)
 
 # System message for the AI assistant
 SYSTEM_MESSAGE = """
@@ -46,13 +95,18 @@ while True:
     if not user_question.strip():
         continue
     
-    # Search the index for the user question
-    results = index.search(user_question)
-    matching_rows = [rows[int(result["ref"])] for result in results]
+    # Search for the rows most relevant to the user question
+    if EMBEDDING_MODEL_NAME:
+        scores = row_vectors @ embed([user_question])[0]
+        top = np.argsort(-scores)[:10]
+        matches = exposures.take(top)
+        matching_rows = zip(*(column.to_pylist() for column in matches.columns))
+    else:
+        matching_rows = con.execute(search_query, [user_question]).fetchall()
     
     # Format as a markdown table, since language models understand markdown
-    matches_table = " | ".join(rows[0]) + "\n" + " | ".join(" --- " for _ in range(len(rows[0]))) + "\n"
-    matches_table += "\n".join(" | ".join(row) for row in matching_rows)
+    matches_table = " | ".join(columns) + "\n" + " | ".join(" --- " for _ in range(len(columns))) + "\n"
+    matches_table += "\n".join(" | ".join(value or "" for value in row) for row in matching_rows)
     
     print("\nFound matches:")
     print(matches_table)
@@ -1,51 +1,244 @@
+import argparse
+import asyncio
+import collections
+import functools
+import json
 import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import weakref
 
-import azure.identity
 import duckdb
-import openai
+import numpy as np
 from dotenv import load_dotenv
 
-# Setup the Azure OpenAI client
-load_dotenv(override=True)
+# Load the Azure OpenAI settings; variables already set in the environment take precedence
+load_dotenv()
+
+# Read the settings once at startup
+AZURE_OPENAI_ENDPOINT = os.environ.get("AZURE_OPENAI_ENDPOINT")
+MODEL_NAME = os.environ.get("AZURE_OPENAI_CHAT_DEPLOYMENT")
+# Optional: when set, the fallback search ranks rows by embedding similarity instead of ILIKE
+EMBEDDING_MODEL_NAME = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+
+
+def check_environment():
+    """Raise ValueError if the settings needed to talk to Azure OpenAI are missing."""
+    # Only the chat needs these; --reindex and schema lookups work without them
+    missing_vars = [
+        name for name, value in [
+            ("AZURE_OPENAI_ENDPOINT", AZURE_OPENAI_ENDPOINT),
+            ("AZURE_OPENAI_CHAT_DEPLOYMENT", MODEL_NAME),
+        ] if not value
+    ]
+    if missing_vars:
+        raise ValueError(
+            f"Missing required environment variables: {', '.join(missing_vars)}. "
+            f"Please set them in your .env file or environment."
+        )
+
+
+class CachedTokenProvider:
+    """Azure AD token provider that reuses a token until it is close to expiring."""
+
+    def __init__(self, credential, scope: str, refresh_margin: float = 300):
+        self._credential = credential
+        self._scope = scope
+        self._refresh_margin = refresh_margin
+        self._token = None
+        # The sync and async clients may ask for a token from different threads at once
+        self._lock = threading.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._token is not None and self._token.expires_on - time.time() > self._refresh_margin
+
+    def __call__(self) -> str:
+        with self._lock:
+            if not self._is_fresh():
+                self._token = self._credential.get_token(self._scope)
+            return self._token.token
+
+    async def get_token_async(self) -> str:
+        """Token provider for the async client; refreshing never blocks the event loop."""
+        if self._is_fresh():
+            return self._token.token
+        # DefaultAzureCredential may probe IMDS or run the az CLI, which can take seconds,
+        # so the refresh (and any wait on the lock) happens in a worker thread
+        return await asyncio.to_thread(self)
+
+
+# openai and azure.identity are slow to import, so the clients are only created on first use;
+# importing the module or running --reindex never pays for them
+@functools.lru_cache(maxsize=1)
+def get_token_provider():
+    """Return the token provider shared by both Azure OpenAI clients."""
+    import azure.identity
+
+    return CachedTokenProvider(
+        azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
+    )
+
 
-# Validate required environment variables
-required_env_vars = ["AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_CHAT_DEPLOYMENT"]
-missing_vars = [var for var in required_env_vars if not os.environ.get(var)]
-if missing_vars:
-    raise ValueError(
-        f"Missing required environment variables: {', '.join(missing_vars)}. "
-        f"Please set them in your .env file or environment."
+def create_openai_client(asynchronous: bool = False):
+    """Create a new AzureOpenAI client, or AsyncAzureOpenAI if asynchronous is set."""
+    check_environment()
+    import openai
+
+    client_class = openai.AsyncAzureOpenAI if asynchronous else openai.AzureOpenAI
+    token_provider = get_token_provider()
+    return client_class(
+        azure_endpoint=AZURE_OPENAI_ENDPOINT,
+        azure_ad_token_provider=token_provider.get_token_async if asynchronous else token_provider,
+        api_version="2024-08-01-preview"
     )
 
-token_provider = azure.identity.get_bearer_token_provider(
-    azure.identity.DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
-)
-client = openai.AzureOpenAI(
-    azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-    azure_ad_token_provider=token_provider,
-    api_version="2024-08-01-preview"
-)
-MODEL_NAME = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT"]
-
-# Parquet file path
+
+# An async client's connection pool belongs to the event loop it first ran on, and breaks
+# once that loop is closed, so every event loop gets its own client
+_async_clients = weakref.WeakKeyDictionary()
+
+
+@functools.lru_cache(maxsize=1)
+def get_sync_client():
+    """Return the synchronous Azure OpenAI client, creating it on first use."""
+    return create_openai_client()
+
+
+def get_openai_client(asynchronous: bool = False):
+    """
+    Return the Azure OpenAI client, creating it on first use.
+    
+    Chat calls use the async client so they can overlap with DuckDB work; embeddings use
+    the synchronous client and run in a worker thread alongside the other searches.
+    
+    Args:
+        asynchronous: Whether to return the running event loop's AsyncAzureOpenAI client
+                      instead of AzureOpenAI
+    """
+    if not asynchronous:
+        return get_sync_client()
+    loop = asyncio.get_running_loop()
+    if loop not in _async_clients:
+        _async_clients[loop] = create_openai_client(asynchronous=True)
+    return _async_clients[loop]
+
+
+EMBEDDING_BATCH_SIZE = 1024
+# Longest cell value sent to the model in the sources table, to keep the answer prompt small
+MAX_SOURCE_CELL_WIDTH = 64
+# Number of generated SQL queries remembered for repeated questions
+SQL_CACHE_SIZE = 512
+# Markdown code fences the model sometimes wraps around the SQL
+_FENCE_RE = re.compile(r"```(?:sql)?")
+
+# Parquet file path, and the DuckDB database file it is converted into
 parquet_path = os.path.join(os.path.dirname(__file__), "data", "exposures.parquet")
+database_path = os.path.join(os.path.dirname(__file__), "data", "exposures.duckdb")
 
 
+def database_is_stale():
+    """Return True if the database file is missing or older than the parquet file."""
+    return not os.path.exists(database_path) or os.path.getmtime(parquet_path) > os.path.getmtime(database_path)
+
+
+def build_database():
+    """Load the parquet file into a fresh exposures database file, replacing any previous copy."""
+    # Build into a temporary file of this process's own and move it into place, so processes
+    # that already have the database open keep reading the old copy, and processes building
+    # at the same time never touch each other's half-built files
+    fd, build_path = tempfile.mkstemp(
+        dir=os.path.dirname(database_path), prefix="exposures.", suffix=".duckdb.build"
+    )
+    os.close(fd)
+    # DuckDB must create the file itself; an empty file is not a valid database
+    os.remove(build_path)
+    try:
+        _write_database(build_path)
+        # Another process may have finished a build from the same parquet file meanwhile;
+        # keep its file rather than replacing it with an identical one
+        if database_is_stale():
+            os.replace(build_path, database_path)
+    finally:
+        for path in (build_path, build_path + ".wal"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _write_database(build_path: str):
+    """Create the exposures tables in a new database file at build_path."""
+    with duckdb.connect(build_path) as build_con:
+        # Keep the parquet file's row order, and with it the clustering --reindex creates, so the
+        # native tables' row groups get the same narrow min/max statistics
+        build_con.execute("SET preserve_insertion_order = true")
+        build_con.execute("CREATE TABLE exposures AS SELECT * FROM read_parquet(?)", [parquet_path])
+
+        # Pre-compute one searchable text column per row for the fallback keyword search, so
+        # each search is a single ILIKE over one column instead of casting every column per query.
+        # *COLUMNS(*) passes every column to concat_ws, so the blob follows the parquet schema.
+        # Values are joined with chr(1) so a pattern cannot match across two columns.
+        build_con.execute("""
+        CREATE TABLE exposures_search AS
+        SELECT *, concat_ws(chr(1), *COLUMNS(*)) AS _search_blob
+        FROM exposures
+        """)
+
+
+# Opened on first use rather than at import, so --reindex never holds the file it replaces
+@functools.lru_cache(maxsize=1)
+def get_database():
+    """Return the shared read-only connection to the exposures database, building it if needed."""
+    # Query a native DuckDB table instead of the parquet file, so repeated queries skip parquet
+    # decoding and get DuckDB's own statistics. The conversion only runs when the database file
+    # is missing or older than the parquet file.
+    if database_is_stale():
+        build_database()
+
+    # The chatbot runs SQL written by the model, so it only ever gets a read-only connection:
+    # nothing it runs can change the saved tables, and several processes can share the file
+    con = duckdb.connect(database_path, read_only=True)
+
+    # Chatbot queries never rely on row order unless they ask for it with ORDER BY, so let DuckDB
+    # scan in parallel without re-ordering. This only applies to this connection; build_database
+    # uses its own connection, which keeps the row order.
+    con.execute("SET preserve_insertion_order = false")
+    return con
+
+# DuckDB connections are not safe to share between threads, so each thread that
+# serves chatbot requests gets its own cursor onto the same database
+_thread_local = threading.local()
+
+
+def get_connection():
+    """Return the calling thread's cursor on the shared exposures database."""
+    cursor = getattr(_thread_local, "cursor", None)
+    if cursor is None:
+        cursor = _thread_local.cursor = get_database().cursor()
+    return cursor
+
+
+# The exposures table never changes while the process runs, so the schema is computed once
+@functools.lru_cache(maxsize=1)
 def get_schema_info():
-    """Load parquet file metadata and return schema information."""
-    with duckdb.connect() as con:
-        record_count = con.execute(f"SELECT COUNT(*) FROM '{parquet_path}'").fetchone()[0]
-        schema_info = con.execute(f"DESCRIBE SELECT * FROM '{parquet_path}'").df()
-        columns = schema_info['column_name'].tolist()
-        column_types = schema_info[['column_name', 'column_type']].to_dict('records')
+    """Return record count and schema information for the exposures table."""
+    cursor = get_connection()
+    record_count = cursor.execute("SELECT COUNT(*) FROM exposures").fetchone()[0]
+    # Plain tuples are enough for a handful of DESCRIBE rows; no need to build a DataFrame
+    schema_rows = cursor.execute("DESCRIBE exposures").fetchall()
+    names = [description[0] for description in cursor.description]
+    column_types = [dict(zip(names, row)) for row in schema_rows]
+    columns = [column["column_name"] for column in column_types]
     return record_count, columns, column_types
 
+@functools.lru_cache(maxsize=1)
 def get_schema_description():
     """Generate schema description for SQL generation."""
     _, _, column_types = get_schema_info()
     return f"""
 Database Schema:
-Table: exposures (stored in parquet file at '{parquet_path}')
+Table: exposures
 Columns:
 {chr(10).join([f"  - {col['column_name']}: {col['column_type']}" for col in column_types])}
 
@@ -62,70 +255,148 @@ Sample data types:
 - premium: insurance premium amount
 """
 
-# System message for the AI assistant
-SYSTEM_MESSAGE = """
+# System message for the AI assistant. It starts every request in the conversation, SQL
+# generation included, so the schema and rules are one stable prefix on every call and can
+# be served from the provider's prompt cache.
+@functools.lru_cache(maxsize=1)
+def get_system_message():
+    """Return the system message, built from the schema description on first use."""
+    return f"""
 You are a helpful assistant that answers questions about vessel insurance exposures based on an exposures data set.
 You must use the data set to answer the questions, you should not provide any info that is not in the provided sources.
-"""
-
-
-def generate_sql_from_question(user_question: str, schema_description: str) -> str:
-    """
-    Convert a natural language question into a SQL query using Azure OpenAI.
-    
-    Args:
-        user_question: The user's natural language question
-        schema_description: Description of the database schema
-    
-    Returns:
-        str: Generated SQL query
-    """
-    sql_generation_prompt = f"""You are a SQL expert. Convert the user's natural language question into a DuckDB SQL query.
-
-{schema_description}
-
-Important rules:
-1. Use the exact path '{parquet_path}' in the FROM clause
-2. Return ONLY the SQL query, no explanations or markdown
+Look up the sources by calling the run_sql tool with a DuckDB SQL query.
+{get_schema_description()}
+Rules for run_sql queries:
+1. Use the table name exposures in the FROM clause
+2. Pass ONLY the SQL query, no explanations or markdown
 3. Limit results to 10 rows unless the user asks for specific aggregations
 4. Use ILIKE for case-insensitive text matching
 5. For "highest", "largest", "most" use ORDER BY DESC
 6. For "lowest", "smallest", "least" use ORDER BY ASC
 7. Always use proper SQL syntax for DuckDB
+8. Select only columns relevant to the question; avoid SELECT *
+"""
 
-User question: {user_question}
-
-SQL Query:"""
 
-    sql_response = client.chat.completions.create(
+# The tool the model calls to look up sources; its result is a markdown table of the rows
+RUN_SQL_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "run_sql",
+        "description": "Run a DuckDB SQL query against the exposures table and return the matching rows.",
+        "parameters": {
+            "type": "object",
+            "properties": {"query": {"type": "string", "description": "DuckDB SQL query to run"}},
+            "required": ["query"],
+        },
+    },
+}
+
+
+async def request_sql(messages: list) -> tuple[str, str]:
+    """Ask the model for a run_sql call and return the call id and its SQL query."""
+    sql_response = await get_openai_client(asynchronous=True).chat.completions.create(
         model=MODEL_NAME,
         temperature=0,
-        messages=[
-            {"role": "system", "content": "You are a SQL expert that converts natural language to DuckDB SQL queries. Return only the SQL query without markdown formatting or explanations."},
-            {"role": "user", "content": sql_generation_prompt}
-        ]
+        messages=messages,
+        tools=[RUN_SQL_TOOL],
+        # Answers must come from the data set, so every turn looks it up
+        tool_choice={"type": "function", "function": {"name": "run_sql"}}
     )
 
-    search_query = sql_response.choices[0].message.content.strip()
+    tool_call = sql_response.choices[0].message.tool_calls[0]
+    search_query = json.loads(tool_call.function.arguments)["query"]
     # Clean up any markdown code blocks
-    return search_query.replace("```sql", "").replace("```", "").strip()
+    return tool_call.id, _FENCE_RE.sub("", search_query).strip()
+
+
+def validate_sql_query(sql_query: str):
+    """Plan the query without running it, raising duckdb.Error if DuckDB rejects it."""
+    # execute() runs every statement in the string, so check there is exactly one SELECT
+    # before handing it to EXPLAIN; otherwise "SELECT ...; DROP ..." would run the DROP
+    statements = duckdb.extract_statements(sql_query)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise duckdb.InvalidInputException("Expected exactly one SELECT statement")
+    get_connection().execute("EXPLAIN " + sql_query)
+
+
+def build_tool_messages(tool_call_id: str, sql_query: str, result: str) -> list:
+    """Return a run_sql call and its result as the assistant and tool messages the chat API expects."""
+    return [
+        {"role": "assistant", "content": None, "tool_calls": [{
+            "id": tool_call_id,
+            "type": "function",
+            "function": {"name": "run_sql", "arguments": json.dumps({"query": sql_query})},
+        }]},
+        {"role": "tool", "tool_call_id": tool_call_id, "content": result},
+    ]
+
+
+# Generated SQL by normalized question, least recently used first. SQL is generated at
+# temperature 0 against a schema that is fixed for the life of the process, so a repeated
+# question can reuse the earlier query and skip the model call.
+_sql_cache = collections.OrderedDict()
+# Threads calling get_response_for_chatbot each run their own event loop, so the cache is
+# shared across threads; the lock is never held across an await
+_sql_cache_lock = threading.Lock()
+
+
+async def generate_sql_from_conversation(messages: list) -> tuple[str, str]:
+    """
+    Get a validated run_sql call for the latest question in the conversation from Azure OpenAI.
+    
+    Args:
+        messages: The conversation so far, starting with the system message and ending
+                  with the user's question
+    
+    Returns:
+        tuple: (tool_call_id, sql_query) - id of the run_sql call and the SQL query it runs
+    
+    Raises:
+        duckdb.Error: If the query is still invalid after one repair attempt
+    """
+    # Later questions can refer back to the conversation, so only opening questions are cached
+    cache_key = " ".join(messages[-1]["content"].lower().split()) if len(messages) == 2 else None
+    with _sql_cache_lock:
+        cached_query = _sql_cache.get(cache_key)
+        if cached_query is not None:
+            _sql_cache.move_to_end(cache_key)
+    if cached_query is not None:
+        return f"call_{uuid.uuid4().hex}", cached_query
+
+    tool_call_id, search_query = await request_sql(messages)
+    try:
+        await asyncio.to_thread(validate_sql_query, search_query)
+    except duckdb.Error as error:
+        # Retry once with DuckDB's error, which usually names the bad column or syntax;
+        # that is cheaper and more useful than dropping to the keyword search
+        failed_call = build_tool_messages(tool_call_id, search_query, f"The query failed: {error}. Fix it.")
+        tool_call_id, search_query = await request_sql(messages + failed_call)
+        await asyncio.to_thread(validate_sql_query, search_query)
+
+    if cache_key is not None:
+        with _sql_cache_lock:
+            _sql_cache[cache_key] = search_query
+            _sql_cache.move_to_end(cache_key)
+            if len(_sql_cache) > SQL_CACHE_SIZE:
+                _sql_cache.popitem(last=False)
+    return tool_call_id, search_query
 
 
 def execute_sql_query(sql_query: str) -> tuple[str, object]:
     """
-    Execute a SQL query against the parquet file.
+    Execute a SQL query against the exposures table.
     
     Args:
         sql_query: SQL query to execute
     
     Returns:
-        tuple: (executed_query, dataframe) - query that was executed and the result dataframe
+        tuple: (executed_query, table) - query that was executed and the result pyarrow Table
     
     Raises:
         Exception: If query execution fails
     """
-    with duckdb.connect() as con:
-        return sql_query, con.execute(sql_query).df()
+    return sql_query, get_connection().execute(sql_query).to_arrow_table()
 
 
 def execute_fallback_search(user_question: str) -> tuple[str, object]:
@@ -136,116 +407,189 @@ def execute_fallback_search(user_question: str) -> tuple[str, object]:
         user_question: The user's question to search for
     
     Returns:
-        tuple: (executed_query, dataframe) - query that was executed and the result dataframe
+        tuple: (executed_query, table) - query that was executed and the result pyarrow Table
     
     Raises:
         Exception: If fallback search execution fails
     """
-    search_query = f"""
-    SELECT *
-    FROM '{parquet_path}'
-    WHERE 
-        CAST(vesselId AS VARCHAR) ILIKE ? OR
-        CAST(vessel AS VARCHAR) ILIKE ? OR
-        CAST(operator AS VARCHAR) ILIKE ? OR
-        CAST(year AS VARCHAR) ILIKE ? OR
-        CAST(type AS VARCHAR) ILIKE ? OR
-        CAST(value AS VARCHAR) ILIKE ? OR
-        CAST(tonnage AS VARCHAR) ILIKE ? OR
-        CAST(length AS VARCHAR) ILIKE ? OR
-        CAST(cargoType AS VARCHAR) ILIKE ? OR
-        CAST(premium AS VARCHAR) ILIKE ?
+    search_query = """
+    SELECT * EXCLUDE (_search_blob)
+    FROM exposures_search
+    WHERE _search_blob ILIKE ?
     LIMIT 10
     """
-    # Create parameter list with wildcards for ILIKE pattern matching
+    # Wrap the question in wildcards for ILIKE pattern matching
     search_pattern = f'%{user_question}%'
-    params = [search_pattern] * 10  # One parameter for each column
     
-    with duckdb.connect() as con:
-        return search_query, con.execute(search_query, params).df()
+    return search_query, get_connection().execute(search_query, [search_pattern]).to_arrow_table()
 
 
-def generate_response_from_data(user_question: str, matches_table: str) -> str:
+def embed_texts(texts: list[str]) -> np.ndarray:
     """
-    Generate a natural language response based on query results using Azure OpenAI.
+    Embed texts with Azure OpenAI in batches.
     
     Args:
-        user_question: The user's original question
-        matches_table: Markdown table of matching records
+        texts: Texts to embed
     
     Returns:
-        str: Generated response from the AI
+        np.ndarray: float32 matrix with one unit-length row vector per text
     """
-    response = client.chat.completions.create(
+    vectors = []
+    for i in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        response = get_openai_client().embeddings.create(model=EMBEDDING_MODEL_NAME, input=texts[i:i + EMBEDDING_BATCH_SIZE])
+        vectors.extend(item.embedding for item in response.data)
+    matrix = np.array(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+@functools.lru_cache(maxsize=1)
+def get_exposure_embeddings() -> tuple[object, np.ndarray]:
+    """Embed every exposure row on first use and cache the rows with their vectors."""
+    exposures = get_connection().execute("SELECT * FROM exposures").to_arrow_table()
+    texts = [" | ".join(map(str, row)) for row in zip(*(column.to_pylist() for column in exposures.columns))]
+    return exposures, embed_texts(texts)
+
+
+def execute_embedding_search(user_question: str) -> tuple[str, object]:
+    """
+    Execute a fallback search ranking rows by cosine similarity to the question.
+    
+    Args:
+        user_question: The user's question to search for
+    
+    Returns:
+        tuple: (search_description, table) - description of the search and the 10 closest rows
+    
+    Raises:
+        Exception: If the embedding request fails
+    """
+    exposures, row_vectors = get_exposure_embeddings()
+    scores = row_vectors @ embed_texts([user_question])[0]
+    top = np.argsort(-scores)[:10]
+    return "embedding similarity search", exposures.take(top)
+
+
+def format_matches_table(table) -> str:
+    """
+    Format query results as a markdown table, since language models understand markdown.
+    
+    Args:
+        table: pyarrow Table of matching records
+    
+    Returns:
+        str: Pipe-separated table with a header row, or a notice if there are no records
+    """
+    if table.num_rows == 0:
+        return "No matching records found."
+    # Every cell is re-tokenized by the model, so cut long values short. All columns are kept:
+    # the query chose them, and the fallback search needs premium, the last one.
+    header = " | ".join(table.column_names)
+    separator = " | ".join(" --- " for _ in table.column_names)
+    rows = zip(*(column.to_pylist() for column in table.columns))
+    return "\n".join([
+        header, separator,
+        *(" | ".join(str(value)[:MAX_SOURCE_CELL_WIDTH] for value in row) for row in rows),
+    ])
+
+
+async def stream_response(messages: list):
+    """
+    Stream a natural language response based on query results using Azure OpenAI.
+    
+    Args:
+        messages: The conversation, ending with the run_sql call and its markdown table of matching records
+    
+    Yields:
+        str: Pieces of the generated response as they arrive
+    """
+    stream = await get_openai_client(asynchronous=True).chat.completions.create(
         model=MODEL_NAME,
         temperature=0.3,
-        messages=[
-            {"role": "system", "content": SYSTEM_MESSAGE},
-            {"role": "user", "content": f"{user_question}\nSources: {matches_table}"},
-        ],
+        messages=messages,
+        # Send the same tools as the SQL request so both calls share the cached prefix
+        tools=[RUN_SQL_TOOL],
+        tool_choice="none",
+        stream=True,
     )
-    return response.choices[0].message.content
+    async for chunk in stream:
+        # Azure sends some chunks without choices, e.g. prompt content filter results
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
 
 
-def build_message_history(conversation_history: list, user_question: str, assistant_response: str) -> list:
+def build_message_history(conversation_history: list, user_question: str, assistant_response: str = None) -> list:
     """
     Build the complete message history ensuring system message is always present.
     
     Args:
         conversation_history: Existing conversation history
         user_question: The user's current question
-        assistant_response: The assistant's response
+        assistant_response: The assistant's response, or None to end the history at the question
     
     Returns:
         list: Complete message history with system message, conversation, and new messages
     """
     # Always ensure system message is at the start
     if not conversation_history or conversation_history[0].get("role") != "system":
-        messages = [{"role": "system", "content": SYSTEM_MESSAGE}]
+        messages = [{"role": "system", "content": get_system_message()}]
         if conversation_history:
             messages.extend(conversation_history)
     else:
         messages = conversation_history.copy()
 
     # Append the new user and assistant messages
-    messages.extend([
-        {"role": "user", "content": user_question},
-        {"role": "assistant", "content": assistant_response}
-    ])
+    messages.append({"role": "user", "content": user_question})
+    if assistant_response is not None:
+        messages.append({"role": "assistant", "content": assistant_response})
     
     return messages
 
 
-def get_response_for_chatbot(user_question: str, conversation_history: list = None) -> dict:
+async def get_response_for_chatbot_async(user_question: str, conversation_history: list = None, on_token=None) -> dict:
     """
     Process a user question and return structured message data for chatbot integration.
     
+    This is the coroutine version for hosts that run an event loop; get_response_for_chatbot
+    wraps it for synchronous callers.
+    
     Args:
         user_question: The user's question about vessel insurance exposures
         conversation_history: Optional list of previous messages in the format:
                              [{"role": "user|assistant|system", "content": "..."}]
+        on_token: Optional callback called with each piece of the assistant response as it streams in
     
     Returns:
         dict with keys:
             - "messages": list of all messages including system, user, and assistant responses
             - "sql_query": the generated SQL query (for debugging/logging)
-            - "data": the raw dataframe as dict (for programmatic access)
+            - "data": the matching records as a pyarrow Table (for programmatic access);
+              call .to_pylist() for a list of dicts
             - "success": boolean indicating if the query was successful
             - "error": error message if success is False
     """
     if conversation_history is None:
         conversation_history = []
+    conversation = build_message_history(conversation_history, user_question)
     
-    schema_description = get_schema_description()
-    
+    # Start the keyword search while the SQL is being generated, so its result is already
+    # available if the generated SQL fails. The embedding search costs API calls, so it only
+    # runs once it is actually needed.
+    fallback_task = None
+    if not EMBEDDING_MODEL_NAME:
+        fallback_task = asyncio.create_task(asyncio.to_thread(execute_fallback_search, user_question))
+
     # Try to generate and execute SQL query
     try:
-        search_query = generate_sql_from_question(user_question, schema_description)
-        search_query, matching_df = execute_sql_query(search_query)
+        tool_call_id, search_query = await generate_sql_from_conversation(conversation)
+        search_query, matching_table = await asyncio.to_thread(execute_sql_query, search_query)
     except Exception:
-        # Fallback to keyword search if SQL generation or execution fails
+        # Fallback to embedding or keyword search if SQL generation or execution fails
         try:
-            search_query, matching_df = execute_fallback_search(user_question)
+            if fallback_task is not None:
+                search_query, matching_table = await fallback_task
+            else:
+                search_query, matching_table = await asyncio.to_thread(execute_embedding_search, user_question)
         except Exception as fallback_error:
             # Return error response if both methods fail
             return {
@@ -259,12 +603,26 @@ def get_response_for_chatbot(user_question: str, conversation_history: list = No
                 "success": False,
                 "error": str(fallback_error)
             }
+        # Hand the fallback rows to the model as the result of a run_sql call of its own
+        tool_call_id = f"call_{uuid.uuid4().hex}"
+    else:
+        if fallback_task is not None:
+            fallback_task.cancel()
+            # cancel() does nothing if the search has already finished, so read its outcome
+            # explicitly; a failed search must not surface as an unretrieved exception
+            fallback_task.add_done_callback(lambda task: task.cancelled() or task.exception())
     
     # Format results as markdown table
-    matches_table = matching_df.to_markdown(index=False) if len(matching_df) > 0 else "No matching records found."
+    matches_table = format_matches_table(matching_table)
     
-    # Generate natural language response from the data
-    assistant_response = generate_response_from_data(user_question, matches_table)
+    # Stream the natural language response from the data. The run_sql call and its result are
+    # only needed for this answer, so they are not kept in the message history.
+    response_parts = []
+    async for text in stream_response(conversation + build_tool_messages(tool_call_id, search_query, matches_table)):
+        response_parts.append(text)
+        if on_token is not None:
+            on_token(text)
+    assistant_response = "".join(response_parts)
     
     # Build complete message history
     messages = build_message_history(conversation_history, user_question, assistant_response)
@@ -272,14 +630,27 @@ def get_response_for_chatbot(user_question: str, conversation_history: list = No
     return {
         "messages": messages,
         "sql_query": search_query,
-        "data": matching_df.to_dict('records') if len(matching_df) > 0 else [],
+        "data": matching_table,
         "success": True,
         "error": None
     }
 
 
-# Example CLI interface (can be removed when integrating with a chatbot)
-if __name__ == "__main__":
+def get_response_for_chatbot(user_question: str, conversation_history: list = None, on_token=None) -> dict:
+    """
+    Process a user question and return structured message data for chatbot integration.
+    
+    Runs get_response_for_chatbot_async to completion on a new event loop, so it cannot be
+    called from inside a running loop; await get_response_for_chatbot_async there instead.
+    Takes the same arguments and returns the same dict.
+    """
+    return asyncio.run(get_response_for_chatbot_async(user_question, conversation_history, on_token))
+
+
+async def main():
+    # Fail fast on missing settings rather than at the first question
+    check_environment()
+
     # Display initial schema information
     record_count, columns, _ = get_schema_info()
     print(f"Loaded {record_count} exposure records from parquet file")
@@ -290,9 +661,9 @@ if __name__ == "__main__":
 
     # Loop to handle multiple questions
     while True:
-        # Get the user question
-        user_question = input(
-            "\nEnter your question about vessel insurance exposures (or 'quit' to exit): ")
+        # Get the user question without blocking the event loop
+        user_question = await asyncio.to_thread(
+            input, "\nEnter your question about vessel insurance exposures (or 'quit' to exit): ")
 
         if user_question.lower() in ['quit', 'exit', 'q']:
             print("Goodbye!")
@@ -301,8 +672,11 @@ if __name__ == "__main__":
         if not user_question.strip():
             continue
 
-        # Call the chatbot function with conversation history
-        result = get_response_for_chatbot(user_question, conversation_history)
+        # Call the chatbot function with conversation history, printing the response as it streams
+        print("\nResponse from Azure OpenAI:\n")
+        result = await get_response_for_chatbot_async(
+            user_question, conversation_history, on_token=lambda text: print(text, end="", flush=True))
+        print()
 
         # Update the conversation history for the next turn
         conversation_history = result["messages"]
@@ -313,8 +687,37 @@ if __name__ == "__main__":
         # Display results
         if result["success"]:
             print(f"\nGenerated SQL Query:\n{result['sql_query']}\n")
-            print(f"Found {len(result['data'])} records\n")
-            print("Response from Azure OpenAI:\n")
-            print(result["messages"][-1]["content"])
+            print(f"Found {len(result['data'])} records")
         else:
             print(f"\nError: {result['error']}")
+
+
+def reindex_parquet():
+    """
+    Rewrite the exposures parquet file sorted by operator, year and value, and rebuild the database.
+    
+    Clustering rows on the columns generated queries usually filter and sort on gives each
+    row group narrow min/max statistics, so DuckDB can skip the row groups that cannot match.
+    """
+    sorted_path = parquet_path + ".sorted"
+    with duckdb.connect() as copy_con:
+        copy_con.execute("""
+        COPY (SELECT * FROM read_parquet($1) ORDER BY operator, year, value DESC)
+        TO $2 (FORMAT PARQUET, ROW_GROUP_SIZE 128000, COMPRESSION 'zstd')
+        """, [parquet_path, sorted_path])
+    os.replace(sorted_path, parquet_path)
+    build_database()
+
+
+# Example CLI interface (can be removed when integrating with a chatbot)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask questions about vessel insurance exposures")
+    parser.add_argument("--reindex", action="store_true",
+                        help="Rewrite exposures.parquet sorted by operator, year and value, then exit")
+    args = parser.parse_args()
+
+    if args.reindex:
+        reindex_parquet()
+        print(f"Rewrote {parquet_path} sorted by operator, year and value")
+    else:
+        asyncio.run(main())